@@ -0,0 +1,105 @@
+import random
+import main
+import run8
+
+# Synthetic sweeps for the sweep calibration fitting in main.py - no miniRD needed.
+# A 9600 baud link gives roughly 20 readings per second.
+
+rate = 20
+failures = 0
+
+def check(name, ok):
+    global failures
+    print(f'{"PASS" if ok else "FAIL"}: {name}')
+    if not ok:
+        failures += 1
+
+def sweep(centers, dwell=0.5, jitter=2, step=35, rate=rate):
+    # Rest on each center for dwell seconds, moving step ADC counts per reading in between
+    values = []
+    for i, c in enumerate(centers):
+        values += [c + random.randint(-jitter, jitter) for _ in range(int(dwell * rate))]
+        if i < len(centers) - 1:
+            direction = 1 if centers[i + 1] > c else -1
+            values += list(range(c + direction * step, centers[i + 1], direction * step))
+    return values
+
+class FakePort:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def reset_input_buffer(self):
+        pass
+
+    def write(self, data):
+        pass
+
+    def readline(self):
+        return self.lines.pop(0) if self.lines else b''
+
+random.seed(8)
+notches = [100 + 100 * j for j in range(9)]
+
+bins, diag = main.fit_throttle_bins(sweep(notches), rate)
+check('ascending sweep gives 9 bins', bins is not None and bins[0]['min'] < 110 and bins[8]['min'] > 890)
+check('every notch holds its center', bins is not None and
+      all(bins[j]['min'] <= notches[j] <= bins[j]['max'] for j in range(9)))
+
+# Detent backlash: coming down, each notch rests a few counts higher than going up
+values = sweep(notches) + sweep([c + 8 for c in notches[-2::-1]])
+bins, diag = main.fit_throttle_bins(values, rate)
+check('up and back sweep covers both sides of each detent', bins is not None and
+      all(bins[j]['min'] <= notches[j] - 1 and bins[j]['max'] >= notches[j] + 7 for j in range(8)))
+
+bins, diag = main.fit_throttle_bins(sweep(notches[::-1]), rate)
+check('reversed ADC direction maps idle to thr0', bins is not None and bins[0]['min'] > 890)
+
+bins, diag = main.fit_throttle_bins(sweep(notches[:8]), rate)
+check('missing notch is rejected', bins is None and 'found 8' in diag['reason'])
+
+values = sweep(notches[:4] + [450] + notches[4:])
+bins, diag = main.fit_throttle_bins(values, rate)
+check('mid-travel pause is rejected', bins is None and 'found 10' in diag['reason'])
+
+bins, diag = main.fit_throttle_bins(sweep(notches, dwell=0.5, jitter=4), rate)
+check('short jittery dwell is still a notch', bins is not None)
+
+for r in (14, 20):
+    fails = 0
+    for _ in range(50):
+        values = sweep(notches + notches[-2::-1], jitter=6, step=50, rate=r)
+        fails += main.fit_throttle_bins(values, r)[0] is None
+    check(f'+/-6 jitter at {r} samples/s fits every sweep', fails == 0)
+
+# Idle is only rested on for the minimum time, every other notch gets a full rest each way
+values = [100] * main.dwell_hits(rate) + sweep(notches[1:]) + sweep(notches[-2:0:-1])
+bins, diag = main.fit_throttle_bins(values, rate)
+check('briefly seen notch has lower confidence', bins is not None and
+      diag['thr0']['confidence'] < min(diag[f'thr{j}']['confidence'] for j in range(1, 8)))
+
+bins, diag = main.fit_throttle_bins(sweep([100 + 18 * j for j in range(9)], jitter=1, step=18), rate)
+check('overlapping notches are rejected', bins is None and 'within' in diag['reason'])
+
+bins, diag = main.fit_throttle_bins([], 0)
+check('empty throttle sweep is rejected', bins is None)
+
+previous = {'min': 10, 'max': 1000}
+cal, diag = main.fit_lever(sweep([20, 990], dwell=1, step=25), rate, previous)
+check('lever sweep finds both ends', diag['ok'] and cal['min'] <= 22 and cal['max'] >= 988)
+
+cal, diag = main.fit_lever(sweep([500], dwell=5), rate, previous)
+check('unmoved lever keeps previous values', not diag['ok'] and cal == previous)
+
+cal, diag = main.fit_lever([], 0, previous)
+check('empty lever sweep keeps previous values', not diag['ok'] and cal == previous)
+
+good = (','.join(['5'] * len(run8.cmd_list)) + '\r\n').encode('utf-8')
+old_fw = (','.join(['5'] * 14) + '\r\n').encode('utf-8')
+port = FakePort([b'5,5,5\r\n', b'', good, b'5,x,5\r\n', b'\xfe5,5\r\n', old_fw, good])
+samples, _ = main.sweep_sample(port, duration=0.05)
+check('short and garbled replies are dropped', len(samples) == 3)
+check('older 14 field firmware replies are kept', [len(m) for m in samples] == [len(run8.cmd_list), 14,
+                                                                               len(run8.cmd_list)])
+
+print(f'{failures} failure(s)')
+exit(1 if failures else 0)
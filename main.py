@@ -1,4 +1,5 @@
 import argparse
+import bisect
 import json
 import run8
 import serial
@@ -30,6 +31,14 @@ toggle_forward = 180
 
 alerter_time = 30
 
+sweep_time = 10             # Seconds of continuous sampling per lever sweep
+throttle_sweep_time = 20    # Throttle sweep covers idle -> 8 -> idle
+sweep_dwell = 0.3           # Seconds a control must rest to count as a settled position
+sweep_jitter = 12           # Readings within this of a rest's median belong to that rest
+sweep_gap_ratio = 2         # Gap between notches must be this many times the widest notch
+lever_min_span = 100        # Smallest acceptable lever min / max difference
+throttle_notches = 9
+
 def crc(blist):
     res = 0
     for b in blist:
@@ -87,6 +96,158 @@ def calibrate_throttle(port, notch : int):
     print(f'[{time.strftime("%H:%M:%S", time.localtime())}] Notch {notch} rval: {current_message[3]}')
     return int(current_message[3])
 
+def sweep_sample(port, duration=sweep_time):
+    # Poll the stand as fast as the serial link allows and collect every reading
+    samples = []
+    port.reset_input_buffer()
+    start_time = time.time()
+    last_tick = -1
+    while time.time() - start_time < duration:
+        tick = int(duration - (time.time() - start_time))
+        if tick != last_tick:
+            print(f'[{time.strftime("%H:%M:%S", time.localtime())}] <-- Sampling ({tick + 1}s left)')
+            last_tick = tick
+        port.write(b'r\n')
+        try:
+            in_line = port.readline().decode('utf-8').strip()
+            current_message = list(map(int, in_line.split(',')))
+        except (UnicodeDecodeError, ValueError):
+            continue  # Garbled, partial or empty line, keep sampling
+        # Only the levers and throttle (fields 0-3) are needed, older firmware sends fewer fields
+        if len(current_message) > 3:
+            samples.append(current_message)
+    rate = len(samples) / duration
+    print(f'[{time.strftime("%H:%M:%S", time.localtime())}] Collected {len(samples)} samples ({rate:.1f}/s)')
+    if not samples:
+        print('No usable readings from the miniRD - each reply needs at least 4 comma separated fields')
+    return samples, rate
+
+def dwell_hits(rate):
+    # Readings needed for a rest of sweep_dwell seconds at the measured sample rate
+    return max(2, int(round(rate * sweep_dwell)))
+
+def find_dwells(values, rate, spread=sweep_jitter):
+    # Runs of consecutive readings staying within spread of the run's median for at least
+    # sweep_dwell seconds. Returned as [lo, hi, hits] in the order they were reached.
+    min_hits = dwell_hits(rate)
+    dwells = []
+    run = []    # Sorted readings of the current run
+    for v in values + [None]:
+        if v is not None and run and abs(v - run[len(run) // 2]) <= spread:
+            bisect.insort(run, v)
+            continue
+        if len(run) >= min_hits:
+            dwells.append([run[0], run[-1], len(run)])
+        run = [] if v is None else [v]
+    return dwells
+
+def fit_lever(values, rate, previous):
+    # Min / max of the positions the lever rested at; keep the previous values if the sweep is unusable
+    dwells = find_dwells(values, rate)
+    diag = {'samples': len(values), 'dwells': len(dwells), 'ok': False}
+    if not dwells:
+        diag['reason'] = 'lever never settled'
+    else:
+        lval = min(d[0] for d in dwells)
+        hval = max(d[1] for d in dwells)
+        diag['span'] = hval - lval
+        if hval - lval < lever_min_span:
+            diag['reason'] = f'span {hval - lval} below {lever_min_span}'
+        else:
+            diag['ok'] = True
+            return {'min': lval, 'max': hval}, diag
+    return {'min': previous['min'], 'max': previous['max']}, diag
+
+def fit_throttle_bins(values, rate, notches=throttle_notches):
+    # Each notch is where the throttle rested; rests on the same notch are merged into one cluster
+    dwells = find_dwells(values, rate)
+    diag = {'samples': len(values), 'transit': len(values) - sum(d[2] for d in dwells), 'ok': False}
+    clusters = []
+    for lo, hi, hits in sorted(dwells):
+        if clusters and lo - clusters[-1][1] <= throttle_delta:
+            clusters[-1][1] = max(clusters[-1][1], hi)
+            clusters[-1][2] += hits
+        else:
+            clusters.append([lo, hi, hits])
+    if len(clusters) != notches:
+        diag['reason'] = f'found {len(clusters)} notches, expected {notches}'
+        return None, diag
+
+    # Sweep starts at idle, so the cluster reached first is notch 0
+    first = dwells[0][0]
+    if clusters[-1][0] <= first <= clusters[-1][1]:
+        clusters.reverse()
+    elif not clusters[0][0] <= first <= clusters[0][1]:
+        diag['reason'] = 'sweep did not start at idle'
+        return None, diag
+
+    gaps = [max(b[0] - a[1], a[0] - b[1]) for a, b in zip(clusters, clusters[1:])]
+    widths = [c[1] - c[0] for c in clusters]
+    if min(gaps) < sweep_gap_ratio * max(widths):
+        diag['reason'] = f'notch gap {min(gaps)} not clearly wider than notch width {max(widths)}'
+        return None, diag
+
+    min_hits = dwell_hits(rate)
+    for j, (lval, hval, hits) in enumerate(clusters):
+        nearest = min(gaps[max(0, j - 1):j + 1])
+        # Bins are matched with +/- throttle_delta, so that much of each gap is consumed
+        margin = nearest - 2 * throttle_delta
+        # Confidence is the weakest of: clearance to the neighbours, notch width against that
+        # clearance, and readings against one full rest on the way up plus one on the way down
+        confidence = min(margin / nearest, 1 - (hval - lval) / nearest, hits / (2 * min_hits), 1.0)
+        diag[f'thr{j}'] = {'samples': hits, 'width': hval - lval, 'margin': margin,
+                           'confidence': round(max(0.0, confidence), 2), 'overlap': margin <= 0}
+        if margin <= 0 and 'reason' not in diag:
+            diag['reason'] = f'notch {j} is within {2 * throttle_delta} of a neighbouring notch'
+    if 'reason' in diag:
+        return None, diag
+    diag['ok'] = True
+    return [{'min': c[0], 'max': c[1]} for c in clusters], diag
+
+def sweep_calibrate(port, calib_data, cal_brakes, cal_throttle):
+    sweep_diag = calib_data.setdefault('sweep_diag', {})
+    if cal_brakes:
+        pending = {'auto': 0, 'indy': 1, 'dyn': 2}
+        while pending:
+            input(f'[{time.strftime("%H:%M:%S", time.localtime())}] '
+                  f'--> Press return, then move levers ({", ".join(pending)}) slowly through their full '
+                  f'range, pausing briefly at each end ({sweep_time}s)')
+            samples, rate = sweep_sample(port)
+            reasons = []
+            for lever, idx in list(pending.items()):
+                lever_cal, lever_diag = fit_lever([m[idx] for m in samples], rate, calib_data[lever])
+                print(f'[{time.strftime("%H:%M:%S", time.localtime())}] {lever}: {lever_cal} {lever_diag}')
+                if lever_diag['ok']:
+                    calib_data[lever] = lever_cal
+                    sweep_diag[lever] = lever_diag
+                    del pending[lever]
+                else:
+                    reasons.append(f'{lever}: {lever_diag["reason"]}')
+            if pending:
+                resp = input(f'Lever sweep rejected ({", ".join(reasons)}) - (r)etry or (s)kip? ')
+                if resp.lower() == 's':
+                    print(f'Lever calibration skipped for {", ".join(pending)} - keeping previous values')
+                    break
+
+    if cal_throttle:
+        while True:
+            input(f'[{time.strftime("%H:%M:%S", time.localtime())}] '
+                  f'--> Move throttle to idle, press return, then step up through every notch to notch 8 '
+                  f'and back down to idle, pausing briefly at each ({throttle_sweep_time}s)')
+            samples, rate = sweep_sample(port, throttle_sweep_time)
+            bins, thr_diag = fit_throttle_bins([m[3] for m in samples], rate)
+            if bins:
+                break
+            resp = input(f'Throttle sweep rejected ({thr_diag["reason"]}) - (r)etry or (s)kip? ')
+            if resp.lower() == 's':
+                print('Throttle calibration skipped - keeping existing notch bins')
+                return
+        for j in range(throttle_notches):
+            calib_data[f'thr{j}'] = bins[j]
+            print(f'[{time.strftime("%H:%M:%S", time.localtime())}] '
+                  f'Notch {j}: {bins[j]} {thr_diag[f"thr{j}"]}')
+        sweep_diag['thr'] = thr_diag
+
 def main():
     try:
         fp = open(cal_fname, 'r')
@@ -244,8 +405,19 @@ def main():
                 cal_throttle = False
             if resp.lower() == 't':
                 cal_brakes = False
+            cal_sweep = False
+            if cal_throttle or cal_brakes:
+                resp = input(f'Calibration mode: (s)weep or (m)anual step-by-step [s]? ')
+                cal_sweep = resp.lower() != 'm'
+
+            if cal_sweep:
+                sweep_calibrate(s_port, calib_data, cal_brakes, cal_throttle)
+            else:
+                # Manual values replace whatever an earlier sweep measured
+                for key in (['auto', 'indy', 'dyn'] if cal_brakes else []) + (['thr'] if cal_throttle else []):
+                    calib_data.get('sweep_diag', {}).pop(key, None)
 
-            if cal_brakes:
+            if cal_brakes and not cal_sweep:
                 input(f'[{time.strftime("%H:%M:%S", time.localtime())}] '
                       f'--> Move all levers (except throttle) to one extreme and press return')
                 print(f'[{time.strftime("%H:%M:%S", time.localtime())}] <-- Reading current lever values')
@@ -274,7 +446,7 @@ def main():
                 calib_data['dyn']['min'] = min(dyn_v1, dyn_v2)
                 calib_data['dyn']['max'] = max(dyn_v1, dyn_v2)
 
-            if cal_throttle:
+            if cal_throttle and not cal_sweep:
                 input(f'[{time.strftime("%H:%M:%S", time.localtime())}] '
                       f'--> Move throttle up to notch 2 and press return')
                 thr_n_up = []  # Moving up the notches